@@ -1,9 +1,15 @@
 import streamlit as st
-import pandas as pd
-import plotly.express as px
-import plotly.graph_objects as go
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+import orjson
 from datetime import datetime, timedelta
+import ast
+import html
+import logging
 import os
+import threading
+import time
 
 # Configure page
 st.set_page_config(
@@ -14,7 +20,7 @@ st.set_page_config(
 )
 
 # Custom CSS for beautiful UI
-st.markdown("""
+_CSS = """
 <style>
     .main-header {
         background: linear-gradient(90deg, #667eea 0%, #764ba2 100%);
@@ -35,6 +41,16 @@ st.markdown("""
         border-left: 4px solid #667eea;
     }
     
+    .metric-grid {
+        display: flex;
+        flex-wrap: wrap;
+        gap: 1rem;
+    }
+    
+    .metric-grid .metric-container {
+        flex: 1 1 200px;
+    }
+    
     .appliance-card {
         background: white;
         padding: 1rem;
@@ -44,6 +60,16 @@ st.markdown("""
         border-left: 3px solid #4CAF50;
     }
     
+    .cards {
+        display: flex;
+        flex-wrap: wrap;
+        gap: 1rem;
+    }
+    
+    .cards .appliance-card {
+        flex: 1 1 200px;
+    }
+    
     .energy-tip {
         background: linear-gradient(45deg, #FFA726, #FF7043);
         color: white;
@@ -61,70 +87,313 @@ st.markdown("""
     .consumption-medium { color: #FF9800; font-weight: bold; }
     .consumption-low { color: #4CAF50; font-weight: bold; }
 </style>
-""", unsafe_allow_html=True)
+"""
+
+# Streamlit drops any element that a rerun does not emit again, so the
+# style block is sent on every run; the frontend skips it when unchanged
+st.markdown(_CSS, unsafe_allow_html=True)
 
 # Initialize session state
 if 'user_data' not in st.session_state:
     st.session_state.user_data = {}
 if 'daily_consumption' not in st.session_state:
     st.session_state.daily_consumption = []
+if '_total_units' not in st.session_state:
+    st.session_state._total_units = 0.0
 if 'setup_complete' not in st.session_state:
     st.session_state.setup_complete = False
 
 # Data persistence functions
-@st.cache_data
-def load_data():
-    """Load existing data from CSV"""
-    try:
-        if os.path.exists('energy_consumption_data.csv'):
-            return pd.read_csv('energy_consumption_data.csv')
-        else:
-            return pd.DataFrame()
-    except:
+logger = logging.getLogger(__name__)
+
+DATA_FILE = 'energy_consumption_data.parquet'
+# Written by older versions; read once if DATA_FILE doesn't exist yet
+LEGACY_CSV_FILE = 'energy_consumption_data.csv'
+# Saves are appended here and folded into DATA_FILE once a day
+LOG_FILE = 'energy_consumption_data.log.jsonl'
+DATA_SCHEMA = pa.schema([
+    ('date', pa.timestamp('us')),
+    ('day', pa.string()),
+    ('user_name', pa.string()),
+    ('base_consumption', pa.int64()),
+    ('appliance_consumption', pa.float64()),
+    ('solar_reduction', pa.float64()),
+    ('total_consumption', pa.float64()),
+    ('estimated_cost', pa.float64()),
+    ('appliances_used', pa.list_(pa.string()))
+])
+
+def _read_parquet_or_empty():
+    """Read the Parquet file, or an empty DataFrame if it is missing"""
+    import pandas as pd
+    if not os.path.exists(DATA_FILE):
         return pd.DataFrame()
+    # Read errors propagate: treating an unreadable file as empty would let
+    # the next compaction overwrite the saved history
+    return pq.read_table(DATA_FILE).to_pandas()
+
+def _read_legacy_csv():
+    """Read data saved as CSV before the switch to Parquet"""
+    import pandas as pd
+    df = pd.read_csv(LEGACY_CSV_FILE)
+    df['date'] = pd.to_datetime(df['date'])
+    # pandas wrote the appliance lists as their Python repr
+    df['appliances_used'] = df['appliances_used'].map(ast.literal_eval)
+    return df
+
+def _read_log():
+    """Read the rows appended to the log since the last compaction"""
+    rows = []
+    # Read errors propagate for the same reason as in _read_parquet_or_empty
+    if os.path.exists(LOG_FILE):
+        with open(LOG_FILE, 'rb') as f:
+            for line in f:
+                try:
+                    rows.append(orjson.loads(line))
+                except orjson.JSONDecodeError:
+                    # Skip a line cut short by a crash mid-write
+                    continue
+    return rows
+
+def _upsert(rows, row):
+    """Insert or replace a logged row in the keyed rows"""
+    # Parquet keeps the date typed, so Analytics doesn't need to parse it
+    rows[(row['date'], row['user_name'])] = {**row, 'date': datetime.fromisoformat(row['date'])}
+
+def _sorted_rows(rows):
+    """Rows in date order, so Analytics never has to sort them"""
+    # Keys start with the ISO date, so sorting the keys sorts by date
+    return [row for _, row in sorted(rows.items())]
+
+@st.cache_resource
+def _store():
+    """Shared in-memory copy of the data, read from disk once per server"""
+    df = _read_parquet_or_empty()
+    migrated = not os.path.exists(DATA_FILE) and os.path.exists(LEGACY_CSV_FILE)
+    if migrated:
+        df = _read_legacy_csv()
+    # Latest row per (date, user_name), so saves are an upsert instead of a dedup
+    rows = {}
+    if not df.empty:
+        for row in df.to_dict('records'):
+            rows[(row['date'].date().isoformat(), row['user_name'])] = row
+    
+    log_rows = _read_log()
+    for row in log_rows:
+        _upsert(rows, row)
+    
+    store = {
+        'df': None,
+        'rows': rows,
+        'compacted_on': None,
+        # Starts from the clock so a rebuilt store never reuses an old cache key
+        'version': time.time_ns(),
+        # Shared by all sessions; guards the log append, upsert and compaction
+        'lock': threading.Lock()
+    }
+    # Compacting also writes migrated CSV data out as Parquet
+    if log_rows or migrated:
+        # No st.* calls here: cache_resource would replay them on every
+        # later _store() call. The rows stay in the log until the next try
+        try:
+            compact_data(store)
+        except Exception:
+            logger.exception("Compacting %s into %s failed", LOG_FILE, DATA_FILE)
+    elif not df.empty and df['date'].is_monotonic_increasing:
+        store['df'] = df
+    return store
+
+def load_data():
+    """Load existing data (callers must not modify it in place)"""
+    store = _store()
+    df = store['df']
+    if df is None:
+        # Rebuilt on first read after a save, so saving never goes through pandas
+        import pandas as pd
+        with store['lock']:
+            rows = _sorted_rows(store['rows'])
+            version = store['version']
+        df = pd.DataFrame(rows)
+        with store['lock']:
+            # A save during the build makes this frame stale; return it
+            # without caching so the next read rebuilds
+            if store['version'] == version:
+                store['df'] = df
+    return df
+
+def save_data(rows):
+    """Save rows to Parquet, raising on failure"""
+    # Write to a temporary file first so a crash never leaves a partial file
+    tmp_file = DATA_FILE + '.tmp'
+    pq.write_table(pa.Table.from_pylist(rows, schema=DATA_SCHEMA), tmp_file)
+    os.replace(tmp_file, DATA_FILE)
 
-def save_data(data):
-    """Save data to CSV"""
-    try:
-        df = pd.DataFrame(data)
-        df.to_csv('energy_consumption_data.csv', index=False)
-        return True
-    except Exception as e:
-        st.error(f"Error saving data: {e}")
-        return False
+def compact_data(store):
+    """Fold the log into the Parquet file and empty the log
+
+    Callers must hold store['lock'] once the store is shared, so no row is
+    appended between the snapshot and the truncate. Raises on failure,
+    leaving the log in place.
+    """
+    save_data(_sorted_rows(store['rows']))
+    # Replaying the log is an upsert, so a crash before this truncate is harmless
+    open(LOG_FILE, 'w').close()
+    store['compacted_on'] = datetime.now().date()
+
+def save_row(row):
+    """Insert or replace the row for its date and user, appending it to the log"""
+    store = _store()
+    with store['lock']:
+        try:
+            with open(LOG_FILE, 'a+b') as f:
+                # End a line torn by a crash first, or this row would be
+                # glued onto it and skipped along with it on replay
+                if f.seek(0, os.SEEK_END) > 0:
+                    f.seek(-1, os.SEEK_END)
+                    if f.read(1) != b'\n':
+                        f.write(b'\n')
+                f.write(orjson.dumps(row, option=orjson.OPT_SERIALIZE_NUMPY) + b'\n')
+        except Exception as e:
+            st.error(f"Error saving data: {e}")
+            return False
+        
+        _upsert(store['rows'], row)
+        store['df'] = None
+        store['version'] += 1
+        
+        # The row is already safe in the log; compaction only bounds its size
+        if store['compacted_on'] != datetime.now().date():
+            try:
+                compact_data(store)
+            except Exception as e:
+                st.warning(f"Data saved, but compacting the data log failed: {e}")
+    return True
 
 # Helper functions
+_BASE = {
+    "1BHK": 3,
+    "2BHK": 4,
+    "3BHK": 5,
+    "4BHK": 6,
+    "Villa": 8
+}
+
+_APPLIANCES = ("AC", "Fridge", "Washing Machine", "Dishwasher", "Water Heater", "Electric Stove")
+_APPL_VALS = np.array([3, 2, 4, 3, 5, 4], dtype=np.float64)
+_APPL_INDEX = {appliance: i for i, appliance in enumerate(_APPLIANCES)}
+
+_DAY_NAMES = ("Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday")
+
+# Upper bounds (inclusive) of the Low and Medium categories
+_CAT_BOUNDS = (5, 10)
+_CAT = (
+    ("Low", "consumption-low"),
+    ("Medium", "consumption-medium"),
+    ("High", "consumption-high")
+)
+
 def calculate_base_consumption(home_type):
     """Calculate base consumption based on home type"""
-    consumption_map = {
-        "1BHK": 3,
-        "2BHK": 4,
-        "3BHK": 5,
-        "4BHK": 6,
-        "Villa": 8
-    }
-    return consumption_map.get(home_type, 4)
-
-def get_appliance_consumption(appliance):
-    """Get consumption units for different appliances"""
-    appliance_map = {
-        "AC": 3,
-        "Fridge": 2,
-        "Washing Machine": 4,
-        "Dishwasher": 3,
-        "Water Heater": 5,
-        "Electric Stove": 4
-    }
-    return appliance_map.get(appliance, 1)
+    return _BASE.get(home_type, 4)
 
 def get_consumption_category(units):
     """Categorize consumption levels"""
-    if units <= 5:
-        return "Low", "consumption-low"
-    elif units <= 10:
-        return "Medium", "consumption-medium"
-    else:
-        return "High", "consumption-high"
+    return _CAT[np.searchsorted(_CAT_BOUNDS, units, side='left')]
+
+# Max points drawn on the trend chart; longer histories are downsampled
+TREND_MAX_POINTS = 1000
+
+def _downsample_lttb(x, y, n_out):
+    """Downsample a series to n_out points with Largest-Triangle-Three-Buckets"""
+    n = len(y)
+    if n <= n_out or n_out < 3:
+        return x, y
+    
+    xf = x.astype('int64').astype(float)
+    yf = y.astype(float)
+    # First and last points are always kept; the rest is split into n_out - 2 buckets
+    edges = np.linspace(1, n - 1, n_out - 1).astype(int)
+    idx = np.empty(n_out, dtype=np.int64)
+    idx[0], idx[-1] = 0, n - 1
+    
+    a = 0
+    for i in range(n_out - 2):
+        start, end = edges[i], edges[i + 1]
+        next_end = edges[i + 2] if i + 2 < len(edges) else n
+        avg_x = xf[end:next_end].mean()
+        avg_y = yf[end:next_end].mean()
+        # Keep the point forming the largest triangle with the previous pick
+        # and the average of the next bucket
+        area = np.abs((xf[a] - avg_x) * (yf[start:end] - yf[a])
+                      - (xf[a] - xf[start:end]) * (avg_y - yf[a]))
+        a = start + int(area.argmax())
+        idx[i + 1] = a
+    
+    return x[idx], y[idx]
+
+def _data_version():
+    """Cache key for the stored data: changes whenever a row is saved"""
+    return _store()['version']
+
+@st.cache_data(max_entries=10)
+def _build_analytics(_df, version, user_name):
+    """Compute Analytics metrics, chart series and recent rows for a user
+
+    The DataFrame itself is not hashed; the cache is keyed on version,
+    which callers get from _data_version().
+    """
+    df = _df
+    # Filter data for current user if available
+    data = df
+    if user_name:
+        user_data = df[df['user_name'] == user_name]
+        if not user_data.empty:
+            data = user_data
+    
+    metrics = {
+        'avg_consumption': data['total_consumption'].mean(),
+        'total_cost': data['estimated_cost'].sum(),
+        'max_consumption': data['total_consumption'].max(),
+        'total_solar': data['solar_reduction'].sum(),
+    }
+    
+    # Daily consumption trend
+    trend = _downsample_lttb(data['date'].values, data['total_consumption'].values,
+                             TREND_MAX_POINTS)
+    
+    # Consumption by day of week
+    day_avg = data.groupby('day')['total_consumption'].mean()
+    day_avg = (day_avg.index.values, day_avg.values)
+    
+    recent_data = data.tail(10)[['date', 'day', 'total_consumption', 'estimated_cost', 'solar_reduction']]
+    recent_data['date'] = recent_data['date'].dt.strftime('%Y-%m-%d')
+    
+    return metrics, trend, day_avg, recent_data
+
+# Figures are cached as resources so reruns reuse the same objects instead
+# of unpickling a copy; like _build_analytics they are keyed on the data version
+@st.cache_resource(max_entries=10)
+def _trend_fig(version, user_name, _dates, _totals):
+    """Build the daily consumption trend chart"""
+    import plotly.graph_objects as go
+    
+    fig = go.Figure(go.Scattergl(x=_dates, y=_totals,
+                                 mode='lines', line=dict(color='#667eea', width=3)))
+    fig.update_layout(title='📈 Daily Energy Consumption Trend',
+                      xaxis_title='Date', yaxis_title='Consumption (units)',
+                      plot_bgcolor='rgba(0,0,0,0)', paper_bgcolor='rgba(0,0,0,0)')
+    return fig
+
+@st.cache_resource(max_entries=10)
+def _day_fig(version, user_name, _days, _avgs):
+    """Build the average consumption by day of week chart"""
+    import plotly.graph_objects as go
+    
+    fig = go.Figure(go.Bar(x=_days, y=_avgs, marker_color='#764ba2'))
+    fig.update_layout(title='📊 Average Consumption by Day',
+                      xaxis_title='Day', yaxis_title='Avg Consumption (units)',
+                      plot_bgcolor='rgba(0,0,0,0)', paper_bgcolor='rgba(0,0,0,0)')
+    return fig
 
 # Main App Header
 st.markdown("""
@@ -143,28 +412,34 @@ page = st.sidebar.radio("Choose a section:",
 if page == "🏠 Home Setup":
     st.markdown("## 🏠 Home & User Information")
     
-    col1, col2 = st.columns(2)
+    # A form reruns the script once on submit instead of on every input change
+    with st.form("setup_form"):
+        col1, col2 = st.columns(2)
     
-    with col1:
-        st.markdown("### 👤 Personal Details")
-        name = st.text_input("📝 Full Name", placeholder="Enter your full name")
-        city = st.text_input("🏙️ City", placeholder="Enter your city")
-        area = st.text_input("📍 Area/Locality", placeholder="Enter your area")
-        people = st.number_input("👥 Number of People", min_value=1, max_value=20, value=2)
+        with col1:
+            st.markdown("### 👤 Personal Details")
+            name = st.text_input("📝 Full Name", placeholder="Enter your full name", key="name_input")
+            city = st.text_input("🏙️ City", placeholder="Enter your city", key="city_input")
+            area = st.text_input("📍 Area/Locality", placeholder="Enter your area", key="area_input")
+            people = st.number_input("👥 Number of People", min_value=1, max_value=20, value=2,
+                                     key="people_input")
     
-    with col2:
-        st.markdown("### 🏡 Home Details")
-        home_type = st.selectbox("🏠 Property Type", 
-                                ["Flat", "Tenement", "Independent House", "Villa"])
-        home_facility = st.selectbox("🛏️ Home Size", 
-                                   ["1BHK", "2BHK", "3BHK", "4BHK", "Villa"])
+        with col2:
+            st.markdown("### 🏡 Home Details")
+            home_type = st.selectbox("🏠 Property Type", 
+                                    ["Flat", "Tenement", "Independent House", "Villa"],
+                                    key="home_type_select")
+            home_facility = st.selectbox("🛏️ Home Size", 
+                                       ["1BHK", "2BHK", "3BHK", "4BHK", "Villa"],
+                                       key="home_facility_select")
         
-        st.markdown("### ⚡ Available Appliances")
-        appliances = st.multiselect("Select your appliances:", 
-                                  ["AC", "Fridge", "Washing Machine", "Dishwasher", 
-                                   "Water Heater", "Electric Stove"])
+            st.markdown("### ⚡ Available Appliances")
+            appliances = st.multiselect("Select your appliances:", list(_APPLIANCES),
+                                        key="appliances_select")
+        
+        submitted = st.form_submit_button("💾 Save Setup", type="primary")
     
-    if st.button("💾 Save Setup", type="primary"):
+    if submitted:
         if name and city and area:
             st.session_state.user_data = {
                 'name': name,
@@ -174,7 +449,7 @@ if page == "🏠 Home Setup":
                 'home_type': home_type,
                 'home_facility': home_facility,
                 'appliances': appliances,
-                'setup_date': datetime.now().strftime('%Y-%m-%d')
+                'setup_date': datetime.now().date().isoformat()
             }
             st.session_state.setup_complete = True
             st.success("✅ Setup completed successfully!")
@@ -187,14 +462,20 @@ if page == "🏠 Home Setup":
         st.markdown("### ✅ Current Setup")
         data = st.session_state.user_data
         
-        col1, col2, col3 = st.columns(3)
-        with col1:
-            st.info(f"👤 **{data.get('name', 'N/A')}**\n📍 {data.get('city', 'N/A')}, {data.get('area', 'N/A')}")
-        with col2:
-            st.info(f"🏠 **{data.get('home_facility', 'N/A')} {data.get('home_type', 'N/A')}**\n👥 {data.get('people', 'N/A')} people")
-        with col3:
-            appliances_text = ", ".join(data.get('appliances', [])) if data.get('appliances') else "None"
-            st.info(f"⚡ **Appliances:**\n{appliances_text}")
+        name = html.escape(data.get('name', 'N/A'))
+        city = html.escape(data.get('city', 'N/A'))
+        area = html.escape(data.get('area', 'N/A'))
+        appliances_text = ", ".join(data.get('appliances', [])) if data.get('appliances') else "None"
+        
+        st.markdown(
+            '<div class="metric-grid">'
+            f'<div class="metric-container">👤 <strong>{name}</strong><br>📍 {city}, {area}</div>'
+            f'<div class="metric-container">🏠 <strong>{data.get("home_facility", "N/A")} {data.get("home_type", "N/A")}</strong><br>'
+            f'👥 {data.get("people", "N/A")} people</div>'
+            f'<div class="metric-container">⚡ <strong>Appliances:</strong><br>{appliances_text}</div>'
+            '</div>',
+            unsafe_allow_html=True
+        )
 
 # DAILY TRACKING PAGE
 elif page == "📊 Daily Tracking":
@@ -204,54 +485,86 @@ elif page == "📊 Daily Tracking":
     
     st.markdown("## 📊 Daily Energy Consumption Tracking")
     
-    # Day selection
-    today = datetime.now().date()
-    selected_date = st.date_input("📅 Select Date", value=today, max_value=today)
-    day_name = selected_date.strftime('%A')
-    
-    st.markdown(f"### ☀️ Tracking for {day_name}, {selected_date}")
-    
-    # Base consumption
-    base_consumption = calculate_base_consumption(st.session_state.user_data.get('home_facility', '2BHK'))
-    daily_consumption = base_consumption
-    
-    st.markdown(f"""
-    <div class="metric-container">
-        <h4>🏠 Base Home Consumption: {base_consumption} units</h4>
-        <small>Based on your {st.session_state.user_data.get('home_facility', '2BHK')} home</small>
-    </div>
-    """, unsafe_allow_html=True)
+    with st.form("daily_form"):
+        # Day selection
+        today = datetime.now().date()
+        selected_date = st.date_input("📅 Select Date", value=today, max_value=today,
+                                      key="date_input")
+        day_name = _DAY_NAMES[selected_date.weekday()]
+        
+        st.markdown(f"### ☀️ Tracking for {day_name}, {selected_date}")
+        
+        # Base consumption
+        base_consumption = calculate_base_consumption(st.session_state.user_data.get('home_facility', '2BHK'))
+        daily_consumption = base_consumption
+        
+        st.markdown(f"""
+        <div class="metric-container">
+            <h4>🏠 Base Home Consumption: {base_consumption} units</h4>
+            <small>Based on your {st.session_state.user_data.get('home_facility', '2BHK')} home</small>
+        </div>
+        """, unsafe_allow_html=True)
+        
+        # Appliance usage tracking
+        st.markdown("### 🔌 Appliance Usage Today")
+        appliances = st.session_state.user_data.get('appliances', [])
+        used_mask = np.zeros(len(appliances), dtype=bool)
+        hours_arr = np.zeros(len(appliances))
+        
+        if appliances:
+            import pandas as pd
+            
+            # One editable table instead of a checkbox and slider per appliance
+            appl_df = pd.DataFrame({'Appliance': appliances, 'Used': False, 'Hours': 8})
+            edited = st.data_editor(
+                appl_df,
+                num_rows='fixed',
+                hide_index=True,
+                use_container_width=True,
+                disabled=['Appliance'],
+                column_config={
+                    'Used': st.column_config.CheckboxColumn("Used today?"),
+                    'Hours': st.column_config.NumberColumn("Hours used", min_value=1, max_value=24,
+                                                           step=1, required=True)
+                },
+                key='appl_editor'
+            )
+            used_mask = edited['Used'].to_numpy(dtype=bool)
+            hours_arr = edited['Hours'].to_numpy(dtype=np.float64)
+        
+        # Solar energy
+        st.markdown("### ☀️ Renewable Energy")
+        solar_used = st.checkbox("Used Solar Energy today?", key="solar_check")
+        solar_hours = st.slider("Solar generation hours", 1, 12, 6, key="solar_hours")
+        
+        col1, col2 = st.columns(2)
+        with col1:
+            st.form_submit_button("🔄 Update Totals")
+        with col2:
+            save_clicked = st.form_submit_button("💾 Save Today's Data", type="primary")
     
-    # Appliance usage tracking
-    st.markdown("### 🔌 Appliance Usage Today")
+    # Consumption for all appliances in one pass, normalized to 8 hours
     appliance_usage = {}
-    appliances = st.session_state.user_data.get('appliances', [])
-    
-    if appliances:
-        cols = st.columns(min(3, len(appliances)))
-        for i, appliance in enumerate(appliances):
-            with cols[i % 3]:
-                used = st.checkbox(f"Used {appliance} today?", key=f"appliance_{appliance}")
-                if used:
-                    hours = st.slider(f"Hours used", 1, 24, 8, key=f"hours_{appliance}")
-                    consumption = get_appliance_consumption(appliance) * (hours / 8)  # Normalized to 8 hours
-                    appliance_usage[appliance] = consumption
-                    daily_consumption += consumption
-                    
-                    st.markdown(f"""
-                    <div class="appliance-card">
-                        <strong>{appliance}</strong><br>
-                        🕐 {hours} hours<br>
-                        ⚡ +{consumption:.1f} units
-                    </div>
-                    """, unsafe_allow_html=True)
-    
-    # Solar energy
-    st.markdown("### ☀️ Renewable Energy")
-    solar_used = st.checkbox("Used Solar Energy today?")
+    cards_html = []
+    if used_mask.any():
+        appl_vals = _APPL_VALS[[_APPL_INDEX[appliance] for appliance in appliances]]
+        units = appl_vals * hours_arr / 8.0
+        daily_consumption += float(units[used_mask].sum())
+        
+        for i in np.flatnonzero(used_mask):
+            appliance, consumption = appliances[i], float(units[i])
+            appliance_usage[appliance] = consumption
+            cards_html.append(
+                f'<div class="appliance-card"><strong>{appliance}</strong><br>'
+                f'🕐 {hours_arr[i]:.0f} hours<br>⚡ +{consumption:.1f} units</div>'
+            )
+    
+    # All cards go out as a single element
+    if cards_html:
+        st.markdown('<div class="cards">' + ''.join(cards_html) + '</div>', unsafe_allow_html=True)
+    
     solar_reduction = 0
     if solar_used:
-        solar_hours = st.slider("Solar generation hours", 1, 12, 6)
         solar_reduction = solar_hours * 1.5  # 1.5 units per hour
         daily_consumption -= solar_reduction
         st.success(f"🌞 Solar energy reduced consumption by {solar_reduction:.1f} units!")
@@ -261,20 +574,21 @@ elif page == "📊 Daily Tracking":
     category, css_class = get_consumption_category(daily_consumption)
     
     # Display results
-    col1, col2, col3 = st.columns(3)
-    with col1:
-        st.metric("⚡ Total Consumption", f"{daily_consumption:.1f} units", 
-                 delta=f"{daily_consumption - base_consumption:.1f}")
-    with col2:
-        st.metric("📊 Category", category)
-    with col3:
-        estimated_cost = daily_consumption * 5.5  # Assuming ₹5.5 per unit
-        st.metric("💰 Estimated Cost", f"₹{estimated_cost:.0f}")
+    estimated_cost = daily_consumption * 5.5  # Assuming ₹5.5 per unit
+    st.markdown(
+        '<div class="metric-grid">'
+        f'<div class="metric-container">⚡ Total Consumption<h3>{daily_consumption:.1f} units</h3>'
+        f'<small>{daily_consumption - base_consumption:+.1f} vs base</small></div>'
+        f'<div class="metric-container">📊 Category<h3 class="{css_class}">{category}</h3></div>'
+        f'<div class="metric-container">💰 Estimated Cost<h3>₹{estimated_cost:.0f}</h3></div>'
+        '</div>',
+        unsafe_allow_html=True
+    )
     
     # Save daily data
-    if st.button("💾 Save Today's Data", type="primary"):
+    if save_clicked:
         daily_data = {
-            'date': selected_date.strftime('%Y-%m-%d'),
+            'date': selected_date.isoformat(),
             'day': day_name,
             'user_name': st.session_state.user_data.get('name'),
             'base_consumption': base_consumption,
@@ -285,19 +599,10 @@ elif page == "📊 Daily Tracking":
             'appliances_used': list(appliance_usage.keys())
         }
         
-        # Load existing data and append
-        existing_data = load_data()
-        if existing_data.empty:
-            df = pd.DataFrame([daily_data])
-        else:
-            df = pd.concat([existing_data, pd.DataFrame([daily_data])], ignore_index=True)
-        
-        # Remove duplicates for same date
-        df = df.drop_duplicates(subset=['date', 'user_name'], keep='last')
-        
-        if save_data(df.to_dict('records')):
+        if save_row(daily_data):
             st.success("✅ Data saved successfully!")
             st.session_state.daily_consumption.append(daily_data)
+            st.session_state._total_units += daily_consumption
         else:
             st.error("❌ Failed to save data")
 
@@ -305,64 +610,40 @@ elif page == "📊 Daily Tracking":
 elif page == "📈 Analytics":
     st.markdown("## 📈 Energy Consumption Analytics")
     
-    # Load data
+    # Read the version first: if a save lands in between, the newer data is
+    # cached under the older version and recomputed on the next rerun
+    version = _data_version()
     data = load_data()
     
     if data.empty:
         st.info("📊 No data available yet. Start tracking your daily consumption!")
         st.stop()
     
-    # Filter data for current user if available
-    if st.session_state.get('user_data', {}).get('name'):
-        user_data = data[data['user_name'] == st.session_state.user_data['name']]
-        if not user_data.empty:
-            data = user_data
-    
-    # Convert date column
-    data['date'] = pd.to_datetime(data['date'])
-    data = data.sort_values('date')
+    user_name = st.session_state.get('user_data', {}).get('name')
+    metrics, trend, day_avg, recent_data = _build_analytics(data, version, user_name)
     
     # Summary metrics
     col1, col2, col3, col4 = st.columns(4)
     with col1:
-        avg_consumption = data['total_consumption'].mean()
-        st.metric("📊 Avg Daily Consumption", f"{avg_consumption:.1f} units")
+        st.metric("📊 Avg Daily Consumption", f"{metrics['avg_consumption']:.1f} units")
     with col2:
-        total_cost = data['estimated_cost'].sum()
-        st.metric("💰 Total Cost", f"₹{total_cost:.0f}")
+        st.metric("💰 Total Cost", f"₹{metrics['total_cost']:.0f}")
     with col3:
-        max_consumption = data['total_consumption'].max()
-        st.metric("📈 Peak Consumption", f"{max_consumption:.1f} units")
+        st.metric("📈 Peak Consumption", f"{metrics['max_consumption']:.1f} units")
     with col4:
-        total_solar = data['solar_reduction'].sum()
-        st.metric("🌞 Solar Savings", f"{total_solar:.1f} units")
+        st.metric("🌞 Solar Savings", f"{metrics['total_solar']:.1f} units")
     
     # Charts
     col1, col2 = st.columns(2)
     
     with col1:
-        # Daily consumption trend
-        fig1 = px.line(data, x='date', y='total_consumption', 
-                      title='📈 Daily Energy Consumption Trend',
-                      labels={'total_consumption': 'Consumption (units)', 'date': 'Date'})
-        fig1.update_traces(line_color='#667eea', line_width=3)
-        fig1.update_layout(plot_bgcolor='rgba(0,0,0,0)', paper_bgcolor='rgba(0,0,0,0)')
-        st.plotly_chart(fig1, use_container_width=True)
+        st.plotly_chart(_trend_fig(version, user_name, *trend), use_container_width=True)
     
     with col2:
-        # Consumption by day of week
-        day_avg = data.groupby('day')['total_consumption'].mean().reset_index()
-        fig2 = px.bar(day_avg, x='day', y='total_consumption',
-                     title='📊 Average Consumption by Day',
-                     labels={'total_consumption': 'Avg Consumption (units)', 'day': 'Day'})
-        fig2.update_traces(marker_color='#764ba2')
-        fig2.update_layout(plot_bgcolor='rgba(0,0,0,0)', paper_bgcolor='rgba(0,0,0,0)')
-        st.plotly_chart(fig2, use_container_width=True)
+        st.plotly_chart(_day_fig(version, user_name, *day_avg), use_container_width=True)
     
     # Recent data table
     st.markdown("### 📋 Recent Consumption Data")
-    recent_data = data.tail(10)[['date', 'day', 'total_consumption', 'estimated_cost', 'solar_reduction']]
-    recent_data['date'] = recent_data['date'].dt.strftime('%Y-%m-%d')
     st.dataframe(recent_data, use_container_width=True)
 
 # ENERGY TIPS PAGE
@@ -422,7 +703,7 @@ elif page == "💡 Energy Tips":
     st.markdown("## 🌍 Environmental Impact")
     
     if st.session_state.daily_consumption:
-        total_units = sum([day['total_consumption'] for day in st.session_state.daily_consumption])
+        total_units = st.session_state._total_units
         co2_saved = total_units * 0.85  # Approximate CO2 kg per unit
         
         col1, col2 = st.columns(2)